@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, json, time, math, requests, re
+import os, json, time, requests, re, threading, sqlite3, functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
 from haversine import haversine
 from unidecode import unidecode
@@ -12,11 +16,29 @@ IN_DIR  = ROOT / "data" / "processed" / "pdf_csv"
 GEO_DIR = ROOT / "data" / "processed" / "geo"
 GEO_DIR.mkdir(parents=True, exist_ok=True)
 
+GEO_DB     = GEO_DIR / "geo.db"
+# Anciens caches CSV : importés dans geo.db s'ils existent encore
 LOC_CACHE  = GEO_DIR / "locations.csv"
 DIST_CACHE = GEO_DIR / "distances.csv"
 
 ORS_API_KEY = os.getenv("ORS_API_KEY")
 ORS_URL = "https://api.openrouteservice.org/v2/directions/driving-car"
+ORS_MATRIX_URL = "https://api.openrouteservice.org/v2/matrix/driving-car"
+ORS_MATRIX_MAX = 3500          # routes (sources x destinations) par requête matrix
+
+GEOAPIFY_API_KEY = os.getenv("GEOAPIFY_API_KEY")
+GEOAPIFY_BATCH_URL = "https://api.geoapify.com/v1/batch"
+GEOAPIFY_BATCH_MAX = 1000      # entrées par job batch
+GEOAPIFY_POLL_S = 10
+GEOAPIFY_POLL_MAX = 60
+
+GEOCODE_WORKERS = 8            # géocodages ORS en parallèle (réponses qui se chevauchent)
+ORS_MIN_INTERVAL = 0.3         # départs de requêtes ORS espacés comme l'ancienne boucle (sleep 0.3)
+NOMINATIM_MIN_INTERVAL = 1.0   # politique Nominatim : 1 requête/s max
+ENRICH_WORKERS = os.cpu_count() or 1   # processus pour lecture/normalisation/écriture des fichiers
+
+EARTH_RADIUS_KM = 6371.0088    # rayon moyen, identique au paquet haversine
+ROAD_FACTOR = 1.2              # approximation route ≈ vol d'oiseau x 1.2
 
 PROV_STATE_TO_COUNTRY = {
     "AB":"Canada","BC":"Canada","MB":"Canada","NB":"Canada","NL":"Canada","NS":"Canada",
@@ -30,30 +52,114 @@ PROV_STATE_TO_COUNTRY = {
     "VA":"USA","WA":"USA","WV":"USA","WI":"USA","WY":"USA",
 }
 
-def normalize_loc(raw: str):
-    if not isinstance(raw, str) or not raw.strip():
-        return {"norm":"", "city":"", "region":"", "country":""}
-    txt = unidecode(raw.strip())
-    m = re.match(r"^(.+?),\s*([A-Za-z]{2})$", txt)
-    if not m:
-        city = txt
-        return {"norm": city.lower(), "city": city.lower(), "region":"", "country":""}
-    city, code = m.group(1).strip(), m.group(2).upper()
-    if code == "PQ": code = "QC"
-    country = PROV_STATE_TO_COUNTRY.get(code, "")
-    norm = f"{city},{code}".lower()
-    if country:
-        norm = f"{city},{code},{country}".lower()
-    return {"norm": norm, "city": city.lower(), "region": code, "country": country}
+LOC_RE = re.compile(r"^(.+?),\s*([A-Za-z]{2})$")
+
+@functools.lru_cache(maxsize=65536)
+def _unidecode(s: str) -> str:
+    # mêmes villes d'un fichier (et d'une année) à l'autre : translittération mémorisée
+    return unidecode(s)
+
+def normalize_loc_series(s: pd.Series) -> pd.DataFrame:
+    """
+    Normalise toute une colonne de lieux 'Ville,XX' (PQ -> QC, pays déduit du code) :
+    'ville,xx,pays' si le pays est connu, 'ville,xx' sinon, 'ville' sans code.
+    unidecode n'est appliqué qu'une fois par valeur distincte.
+    -> DataFrame aux colonnes norm, city, region, country
+    """
+    raw = s.fillna("").astype(str).str.strip()
+    uniq = raw.unique()
+    txt = raw.map(dict(zip(uniq, map(_unidecode, uniq))))
+
+    parts = txt.str.extract(LOC_RE)
+    matched = parts[0].notna()
+    city = parts[0].str.strip().where(matched, txt).str.lower()
+    code = parts[1].fillna("").str.upper().replace("PQ", "QC")
+    country = code.map(PROV_STATE_TO_COUNTRY).fillna("")
+
+    norm = np.where(country != "", city + "," + code.str.lower() + "," + country.str.lower(),
+                    city + "," + code.str.lower())
+    norm = np.where(matched, norm, city)
+    return pd.DataFrame({"norm": norm, "city": city, "region": code, "country": country}, index=s.index)
+
+LOC_COLS  = ["location","norm","lat","lon","country"]
+DIST_COLS = ["origin_norm","dest_norm","distance_km","method"]
+
+# Caches en mémoire : lookup O(1). geo.db (SQLite) en est la copie persistante,
+# alimentée au fil de l'eau et validée en une transaction par fichier.
+loc_cache:  dict[str, tuple[float, float, str, str]] = {}   # norm -> (lat, lon, country, location)
+dist_cache: dict[tuple[str, str], tuple[float, str]] = {}   # (origin_norm, dest_norm) -> (distance_km, method)
+geo_db: sqlite3.Connection | None = None
 
 def load_csv(path, cols):
     if path.exists():
-        return pd.read_csv(path)
+        return pd.read_csv(path, keep_default_na=False)
     return pd.DataFrame(columns=cols)
 
-def save_csv(df, path, subset):
-    df.drop_duplicates(subset=subset, inplace=True)
-    df.to_csv(path, index=False)
+def open_geo_db(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS locations(
+            norm TEXT PRIMARY KEY, lat REAL, lon REAL, country TEXT, location TEXT);
+        CREATE TABLE IF NOT EXISTS distances(
+            origin_norm TEXT, dest_norm TEXT, distance_km REAL, method TEXT,
+            PRIMARY KEY(origin_norm, dest_norm));
+    """)
+    return conn
+
+def remember_location(norm, lat, lon, country, location):
+    loc_cache[norm] = (lat, lon, country, location)
+    geo_db.execute("INSERT OR IGNORE INTO locations VALUES (?,?,?,?,?)", (norm, lat, lon, country, location))
+
+def remember_distance(on, dn, km, method):
+    dist_cache[(on, dn)] = (km, method)
+    geo_db.execute("INSERT OR IGNORE INTO distances VALUES (?,?,?,?)", (on, dn, km, method))
+
+def load_caches():
+    global geo_db
+    geo_db = open_geo_db(GEO_DB)
+    # migration des anciens CSV (INSERT OR IGNORE : la base garde la priorité)
+    geo_db.executemany("INSERT OR IGNORE INTO locations VALUES (?,?,?,?,?)",
+                       [(r.norm, float(r.lat), float(r.lon), r.country, r.location)
+                        for r in load_csv(LOC_CACHE, LOC_COLS).itertuples(index=False)])
+    geo_db.executemany("INSERT OR IGNORE INTO distances VALUES (?,?,?,?)",
+                       [(r.origin_norm, r.dest_norm, float(r.distance_km), r.method)
+                        for r in load_csv(DIST_CACHE, DIST_COLS).itertuples(index=False)])
+    geo_db.commit()
+    for norm, lat, lon, country, loc in geo_db.execute("SELECT norm, lat, lon, country, location FROM locations"):
+        loc_cache.setdefault(norm, (lat, lon, country, loc))
+    for on, dn, km, meth in geo_db.execute("SELECT origin_norm, dest_norm, distance_km, method FROM distances"):
+        dist_cache.setdefault((on, dn), (km, meth))
+
+def save_caches():
+    geo_db.commit()
+
+def make_session() -> requests.Session:
+    """Session HTTP partagée : pool de connexions keep-alive, retries avec backoff, réponses gzip."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=None,   # POST inclus (matrix / batch sont idempotents)
+                  raise_on_status=False)  # retries épuisés : on rend la réponse (r.ok False -> fallback)
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "leggi-distance/1.0"})
+    return session
+
+class Throttle:
+    """Espace les départs d'appels d'au moins `interval` secondes, tous threads confondus."""
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = 0.0
+
+    def wait(self):
+        with self.lock:
+            wait = self.last + self.interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.last = time.monotonic()
+
+_ors_throttle = Throttle(ORS_MIN_INTERVAL)
+_nominatim_throttle = Throttle(NOMINATIM_MIN_INTERVAL)
 
 def geocode(norm: str, country_hint: str, session: requests.Session):
     if ORS_API_KEY:
@@ -61,6 +167,7 @@ def geocode(norm: str, country_hint: str, session: requests.Session):
         params = {"api_key": ORS_API_KEY, "text": norm}
         if country_hint:
             params["boundary.country"] = "CA" if country_hint=="Canada" else "US"
+        _ors_throttle.wait()
         r = session.get(url, params=params, timeout=20)
         if r.ok:
             js = r.json()
@@ -70,6 +177,7 @@ def geocode(norm: str, country_hint: str, session: requests.Session):
                 return (float(lat), float(lon))
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": norm, "format":"json", "limit":1}
+    _nominatim_throttle.wait()
     r = session.get(url, params=params, headers={"User-Agent":"leggi-distance/1.0"}, timeout=20)
     if r.ok:
         arr = r.json()
@@ -77,21 +185,53 @@ def geocode(norm: str, country_hint: str, session: requests.Session):
             return (float(arr[0]["lat"]), float(arr[0]["lon"]))
     return None
 
-def get_coords(location_str: str, loc_cache: pd.DataFrame, session: requests.Session):
-    info = normalize_loc(location_str)
-    norm = info["norm"]
-    if not norm:
-        return None, loc_cache
-    row = loc_cache.loc[loc_cache["norm"] == norm]
-    if not row.empty:
-        return (row.iloc[0]["lat"], row.iloc[0]["lon"]), loc_cache
-    coords = geocode(norm, info["country"], session)
-    if coords:
-        new = {"location": location_str, "norm": norm, "lat": coords[0], "lon": coords[1], "country": info["country"]}
-        loc_cache = pd.concat([loc_cache, pd.DataFrame([new])], ignore_index=True)
-        time.sleep(0.3)
-        return coords, loc_cache
-    return None, loc_cache
+def geocode_many(items, session: requests.Session) -> dict:
+    """
+    Géocode en parallèle une liste de (norm, country_hint) avec geocode().
+    Les appels ORS se chevauchent mais partent au plus un par ORS_MIN_INTERVAL ;
+    le repli Nominatim reste limité à 1 req/s.
+    -> dict norm -> (lat, lon) pour les lieux trouvés
+    """
+    if not items:
+        return {}
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as ex:
+        results = ex.map(lambda it: geocode(it[0], it[1], session), items)
+        return {norm: coords for (norm, _), coords in zip(items, results) if coords}
+
+def geocode_batch(norms: list[str], session: requests.Session) -> dict:
+    """
+    Géocode une liste de lieux via un job batch Geoapify (un POST, puis polling).
+    -> dict norm -> (lat, lon) ; vide si pas de clé ou en cas d'échec.
+    """
+    if not GEOAPIFY_API_KEY or not norms:
+        return {}
+    found = {}
+    for i in range(0, len(norms), GEOAPIFY_BATCH_MAX):
+        chunk = norms[i:i + GEOAPIFY_BATCH_MAX]
+        body = {
+            "api": "/v1/geocode/search",
+            "params": {"format": "json", "limit": 1},
+            "inputs": [{"id": n, "params": {"text": n}} for n in chunk],
+        }
+        r = session.post(GEOAPIFY_BATCH_URL, params={"apiKey": GEOAPIFY_API_KEY}, json=body, timeout=30)
+        if r.status_code not in (200, 202):
+            continue
+        job = r.json()
+        # 202 = job accepté : on interroge jusqu'à obtenir 200 avec les résultats
+        for _ in range(GEOAPIFY_POLL_MAX):
+            if r.status_code == 200:
+                break
+            time.sleep(GEOAPIFY_POLL_S)
+            r = session.get(GEOAPIFY_BATCH_URL, params={"id": job.get("id"), "apiKey": GEOAPIFY_API_KEY}, timeout=30)
+        if r.status_code != 200:
+            continue
+        for item in r.json():
+            try:
+                res = item["result"]["results"][0]
+                found[item["id"]] = (float(res["lat"]), float(res["lon"]))
+            except Exception:
+                pass
+    return found
 
 def ors_distance_km(a_latlon, b_latlon, session: requests.Session):
     if not ORS_API_KEY:
@@ -106,38 +246,138 @@ def ors_distance_km(a_latlon, b_latlon, session: requests.Session):
             return None
     return None
 
-def pair_distance(origin, dest, loc_cache, dist_cache, session):
-    oinfo = normalize_loc(origin); dinfo = normalize_loc(dest)
-    on, dn = oinfo["norm"], dinfo["norm"]
+def ors_matrix_km(pairs, session: requests.Session) -> dict:
+    """
+    Distances routières pour plusieurs paires (norms déjà géocodés) via l'API matrix ORS,
+    en un appel par tranche d'origines au lieu d'un appel directions par paire.
+    -> dict (origin_norm, dest_norm) -> km
+    """
+    if not ORS_API_KEY or not pairs:
+        return {}
+    wanted = set(pairs)
+    srcs = sorted({on for on, _ in wanted})
+    dsts = sorted({dn for _, dn in wanted})
+    step = max(1, ORS_MATRIX_MAX // len(dsts))
+    found = {}
+    for i in range(0, len(srcs), step):
+        chunk = srcs[i:i + step]
+        locs = chunk + dsts
+        body = {
+            "locations": [[loc_cache[n][1], loc_cache[n][0]] for n in locs],
+            "sources": list(range(len(chunk))),
+            "destinations": list(range(len(chunk), len(locs))),
+            "metrics": ["distance"],
+            "units": "km",
+        }
+        r = session.post(ORS_MATRIX_URL, headers={"Authorization": ORS_API_KEY, "Content-Type":"application/json"},
+                         data=json.dumps(body), timeout=60)
+        if not r.ok:
+            continue
+        try:
+            rows = r.json()["distances"]
+        except Exception:
+            continue
+        for on, row in zip(chunk, rows):
+            for dn, km in zip(dsts, row):
+                if km is not None and (on, dn) in wanted:
+                    found[(on, dn)] = float(km)
+    return found
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Distance orthodromique (km) vectorisée sur des tableaux de latitudes/longitudes en degrés.
+    Calcul en place (out=) : deux tampons de travail au lieu d'un temporaire par opération.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))   # copies, modifiables
+    a = np.subtract(lat2, lat1)
+    a *= 0.5; np.sin(a, out=a); a *= a                      # sin²(dlat/2)
+    lon2 -= lon1
+    lon2 *= 0.5; np.sin(lon2, out=lon2); lon2 *= lon2       # sin²(dlon/2)
+    lon2 *= np.cos(lat1, out=lat1)
+    lon2 *= np.cos(lat2, out=lat2)
+    a += lon2
+    np.sqrt(a, out=a); np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_KM
+    return a
+
+def add_haversine_distances(onorm, dnorm):
+    """Calcule en un seul appel numpy les distances des paires géocodées absentes de dist_cache."""
+    # une entrée par paire distincte (une ligne active revient sur de nombreuses commandes)
+    todo = list(dict.fromkeys(p for p in zip(onorm, dnorm)
+                              if p not in dist_cache and p[0] in loc_cache and p[1] in loc_cache))
+    if not todo:
+        return
+    o = np.array([loc_cache[on][:2] for on, _ in todo], dtype=float)
+    d = np.array([loc_cache[dn][:2] for _, dn in todo], dtype=float)
+    km = haversine_np(o[:, 0], o[:, 1], d[:, 0], d[:, 1]) * ROAD_FACTOR
+    for pair, k in zip(todo, km):
+        remember_distance(*pair, float(k), "haversine_x1.2")
+
+def ensure_geocoded(df, oinfo, dinfo, session):
+    """
+    Géocode en une passe tous les lieux du fichier absents de loc_cache,
+    origines et destinations confondues (batch Geoapify puis geocode_many).
+    Ensuite les paires se résolvent par simple lookup, sans HTTP de géocodage.
+    """
+    locs = pd.concat([
+        pd.DataFrame({"location": df["origin"].str.strip(), "norm": oinfo["norm"], "country": oinfo["country"]}),
+        pd.DataFrame({"location": df["destination"].str.strip(), "norm": dinfo["norm"], "country": dinfo["country"]}),
+    ]).drop_duplicates("norm")
+    locs = locs[(locs["norm"] != "") & ~locs["norm"].isin(loc_cache.keys())]
+
+    coords = geocode_batch(sorted(locs["norm"]), session)
+    rest = [(norm, country) for norm, country in zip(locs["norm"], locs["country"]) if norm not in coords]
+    coords.update(geocode_many(rest, session))
+    for loc, norm, country in locs.itertuples(index=False):
+        if norm in coords:
+            lat, lon = coords[norm]
+            remember_location(norm, lat, lon, country, loc)
+
+def warm_caches(df, oinfo, dinfo, session):
+    """Remplit loc_cache / dist_cache en lot avant l'évaluation des paires."""
+    ensure_geocoded(df, oinfo, dinfo, session)
+
+    pairs = {(on, dn) for on, dn in zip(oinfo["norm"], dinfo["norm"])
+             if on and dn and (on, dn) not in dist_cache and on in loc_cache and dn in loc_cache}
+    for pair, km in ors_matrix_km(sorted(pairs), session).items():
+        remember_distance(*pair, km, "ors")
+
+    # Sans ORS, toutes les paires restantes passent par le haversine vectorisé
+    if not ORS_API_KEY:
+        add_haversine_distances(oinfo["norm"], dinfo["norm"])
+
+def pair_distance(on, dn, session):
     if not on or not dn:
-        return None, loc_cache, dist_cache
+        return None
 
-    row = dist_cache.loc[(dist_cache["origin_norm"]==on) & (dist_cache["dest_norm"]==dn)]
-    if not row.empty:
-        return float(row.iloc[0]["distance_km"]), loc_cache, dist_cache
+    if (on, dn) in dist_cache:
+        return dist_cache[(on, dn)][0]
 
-    ocoords, loc_cache = get_coords(origin, loc_cache, session)
-    dcoords, loc_cache = get_coords(dest, loc_cache, session)
-    if not ocoords or not dcoords:
-        return None, loc_cache, dist_cache
+    # loc_cache est complet après ensure_geocoded : un lieu absent n'a pas pu être géocodé
+    if on not in loc_cache or dn not in loc_cache:
+        return None
+    ocoords = loc_cache[on][:2]
+    dcoords = loc_cache[dn][:2]
 
     dist_km = ors_distance_km(ocoords, dcoords, session)
     method = "ors" if dist_km is not None else "haversine_x1.2"
     if dist_km is None:
-        dist_km = haversine(tuple(ocoords), tuple(dcoords)) * 1.2
+        dist_km = haversine(tuple(ocoords), tuple(dcoords)) * ROAD_FACTOR
 
-    new = {"origin_norm": on, "dest_norm": dn, "distance_km": dist_km, "method": method}
-    dist_cache = pd.concat([dist_cache, pd.DataFrame([new])], ignore_index=True)
-    return dist_km, loc_cache, dist_cache
+    remember_distance(on, dn, dist_km, method)
+    return dist_km
 
-def safe_ratio(a, b):
-    try:
-        a = float(a); b = float(b)
-        return round(a/b, 4) if b and b>0 else math.nan
-    except:
-        return math.nan
+def per_km(values, km):
+    """Ratio valeur/km arrondi à 4 décimales ; NaN si la distance est absente ou nulle."""
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(km > 0, np.round(values / km, 4), np.nan)
 
-def enrich_file(path: Path):
+def prepare_file(path: Path):
+    """
+    Partie indépendante par fichier (exécutée dans un processus du pool) :
+    lecture, typage, normalisation des lieux. Aucun accès aux caches ni HTTP.
+    """
     df = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
     required = ["order_no","req_pu_date","customer","origin","destination","revenue","cost","margin"]
     missing = [c for c in required if c not in df.columns]
@@ -148,39 +388,56 @@ def enrich_file(path: Path):
     for c in ["revenue","cost","margin"]:
         df[c] = pd.to_numeric(df[c], errors="coerce")
 
-    loc_cache  = load_csv(LOC_CACHE,  ["location","norm","lat","lon","country"])
-    dist_cache = load_csv(DIST_CACHE, ["origin_norm","dest_norm","distance_km","method"])
-    session = requests.Session()
-
-    distances = []
-    for _, row in df.iterrows():
-        o = (row.get("origin") or "").strip()
-        d = (row.get("destination") or "").strip()
-        if not o or not d:
-            distances.append(math.nan); continue
-        dkm, loc_cache, dist_cache = pair_distance(o, d, loc_cache, dist_cache, session)
-        distances.append(dkm if dkm is not None else math.nan)
+    return df, normalize_loc_series(df["origin"]), normalize_loc_series(df["destination"])
 
-    df["distance_km"]    = distances
-    df["revenue_per_km"] = [safe_ratio(r,k) for r,k in zip(df["revenue"], df["distance_km"])]
-    df["cost_per_km"]    = [safe_ratio(c,k) for c,k in zip(df["cost"], df["distance_km"])]
-    margin_abs = df["revenue"] - df["cost"]
-    df["margin_per_km"]  = [safe_ratio(m,k) for m,k in zip(margin_abs, df["distance_km"])]
+def add_distances(df, oinfo, dinfo, session):
+    # Une seule évaluation par paire (origin_norm, dest_norm) distincte, puis report sur les lignes
+    o_arr = oinfo["norm"].to_numpy()
+    d_arr = dinfo["norm"].to_numpy()
+    mask = (df["origin"].str.strip() != "").to_numpy() & (df["destination"].str.strip() != "").to_numpy()
+    pairs = pd.DataFrame({"on": o_arr[mask], "dn": d_arr[mask]}).drop_duplicates()
+    pair_dist = {(on, dn): pair_distance(on, dn, session) for on, dn in pairs.itertuples(index=False)}
 
-    save_csv(loc_cache, LOC_CACHE, ["norm"])
-    save_csv(dist_cache, DIST_CACHE, ["origin_norm","dest_norm"])
+    # Lignes sans origine/destination : NaN d'office, on ne parcourt que les indices utiles
+    km = np.full(len(df), np.nan)
+    for i in np.flatnonzero(mask):
+        km[i] = pair_dist[(o_arr[i], d_arr[i])]
+    df["distance_km"]    = km
+    df["revenue_per_km"] = per_km(df["revenue"], km)
+    df["cost_per_km"]    = per_km(df["cost"], km)
+    df["margin_per_km"]  = per_km(df["revenue"] - df["cost"], km)
+    return df
 
+def write_enriched(path: Path, df: pd.DataFrame) -> Path:
+    """Écrit le TSV enrichi et son jumeau Parquet (exécutée dans un processus du pool)."""
     out = path.with_name(path.stem + "_enriched.tsv")
     df.to_csv(out, sep="\t", index=False)
-    print(f"✅ Enrichi: {path.name} → {out.name} ({df.shape[0]} lignes)")
+    # jumeau Parquet (typé, colonnaire) lu en priorité par merge_enriched.py
+    df.to_parquet(out.with_suffix(".parquet"), compression="zstd", index=False)
+    return out
 
 def main():
     files = sorted(IN_DIR.glob("*_norm.tsv"))
     if not files:
         print("Aucun TSV normalisé (*_norm.tsv) trouvé.")
         return
-    for f in files:
-        enrich_file(f)
+    load_caches()
+    session = make_session()
+
+    with ProcessPoolExecutor(max_workers=min(len(files), ENRICH_WORKERS)) as pool:
+        prepared = list(pool.map(prepare_file, files))
+
+        # Géocodage + matrix centralisés dans le parent : une seule file de lieux inconnus pour tous les fichiers
+        warm_caches(*(pd.concat(parts, ignore_index=True) for parts in zip(*prepared)), session)
+
+        writes = []
+        for path, (df, oinfo, dinfo) in zip(files, prepared):
+            add_distances(df, oinfo, dinfo, session)
+            save_caches()
+            writes.append((path, len(df), pool.submit(write_enriched, path, df)))
+
+        for path, n, fut in writes:
+            print(f"✅ Enrichi: {path.name} → {fut.result().name} ({n} lignes)")
 
 if __name__ == "__main__":
     main()
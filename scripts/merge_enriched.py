@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import re
+import re, shutil
 from pathlib import Path
 import pandas as pd
 
@@ -15,8 +15,15 @@ EXPECTED_COLS = [
 
 YEAR_RE = re.compile(r"(\d{4})")
 
+def read_enriched(file: Path) -> pd.DataFrame:
+    """Lit le jumeau Parquet s'il est à jour (déjà typé, sans re-parsing texte), sinon le TSV."""
+    pq = file.with_suffix(".parquet")
+    if pq.exists() and pq.stat().st_mtime >= file.stat().st_mtime:
+        return pd.read_parquet(pq)
+    return pd.read_csv(file, sep="\t", dtype=str, engine="c")
+
 def load_one(file: Path) -> pd.DataFrame:
-    df = pd.read_csv(file, sep="\t", dtype=str, engine="python")
+    df = read_enriched(file)
     df.columns = [c.strip().lower() for c in df.columns]
 
     # Colonnes manquantes -> colonnes vides
@@ -26,7 +33,7 @@ def load_one(file: Path) -> pd.DataFrame:
     df = df[EXPECTED_COLS].copy()
 
     # Parse dates si possible
-    df["req_pu_date"] = pd.to_datetime(df["req_pu_date"], errors="coerce", utc=False)
+    df["req_pu_date"] = pd.to_datetime(df["req_pu_date"], format="%Y-%m-%d", errors="coerce", cache=True)
 
     # Types numériques
     for c in ["revenue","cost","margin","distance_km","rate_per_km","cost_per_km","margin_per_km"]:
@@ -46,8 +53,7 @@ def load_one(file: Path) -> pd.DataFrame:
             print(f"⚠️  {file.name}: aucune date exploitable et pas d’année dans le nom → lignes sans année")
 
     # Dedup (ordre + date)
-    df = df.drop_duplicates(subset=["order_no","req_pu_date"], keep="last")
-    return df
+    return df.drop_duplicates(subset=["order_no","req_pu_date"], keep="last")
 
 def main():
     files = sorted(ENRICHED_DIR.glob("*_enriched.tsv"))
@@ -70,22 +76,32 @@ def main():
 
     all_df = pd.concat(parts, ignore_index=True)
 
+    # Colonnes texte très répétitives -> category (codes entiers + dictionnaire)
+    for c in ["customer","origin","destination"]:
+        all_df[c] = all_df[c].astype("category")
+
     # Si vraiment aucune année, on abandonne (évite d’écrire seulement le master vide)
     if all_df["year"].isna().all():
         print("❌ Aucune année détectée dans les données fusionnées — rien à écrire par année.")
         raise SystemExit(1)
 
-    # Tri + écriture master
+    # Tri + écriture master (tri multi-colonnes stable : les tranches par année en héritent l'ordre)
     all_df = all_df.sort_values(["req_pu_date","order_no"], kind="mergesort", na_position="last")
     all_path = OUT_DIR / "orders_master_enriched.tsv"
     all_df.to_csv(all_path, sep="\t", index=False)
     print(f"💾 Master écrit: {all_path} ({len(all_df)} lignes)")
+
+    # Jumeau Parquet partitionné par année (orders_master_enriched.parquet/year=YYYY/…)
+    pq_path = OUT_DIR / "orders_master_enriched.parquet"
+    shutil.rmtree(pq_path, ignore_errors=True)
+    all_df.astype({"year": "Int64"}).to_parquet(pq_path, partition_cols=["year"], compression="zstd", index=False,
+                                                basename_template="part-{i}.parquet")
+    print(f"💾 Parquet écrit: {pq_path}")
     print(f"   Années présentes: {sorted(set(all_df['year'].dropna().astype(int)))}")
 
-    # Écriture par année
+    # Écriture par année (groupby conserve l'ordre du master : pas de re-tri)
     wrote_any_year = False
-    for year, g in all_df.groupby(all_df["year"].dropna().astype(int)):
-        ydf = g.sort_values(["req_pu_date","order_no"], kind="mergesort", na_position="last")
+    for year, ydf in all_df.groupby(all_df["year"].dropna().astype(int)):
         ypath = OUT_DIR / f"orders_{int(year)}_enriched.tsv"
         ydf.to_csv(ypath, sep="\t", index=False)
         wrote_any_year = True
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import re, math
+import re, functools
 from pathlib import Path
 import pandas as pd
 from unidecode import unidecode
@@ -12,107 +12,97 @@ IN_DIR = ROOT / "data" / "processed" / "pdf_csv"
 # Schéma cible
 OUT_COLS = ["order_no","req_pu_date","customer","origin","destination","revenue","cost","margin"]
 
-def to_float(s):
-    if s is None:
-        return math.nan
-    s = str(s)
-    s = re.sub(r"[^\d.\-]", "", s)  # enlève CA, $, espaces, etc.
-    try:
-        return float(s) if s != "" else math.nan
-    except:
-        return math.nan
-
-def parse_date_ddmmyyyy(s: str) -> str:
-    m = re.search(r"(\d{2})/(\d{2})/(\d{4})", s or "")
-    if not m:
-        return ""
-    dd, mm, yyyy = m.groups()
-    return f"{yyyy}-{mm}-{dd}"
-
-def split_origin_dest_revenue(text: str):
+# Regex compilées une fois, appliquées colonne par colonne (.str.extract)
+NUM_PAT       = r"\d+(?:\.\d{1,2})?"
+ORDER_DATE_RE = re.compile(r"(\d+)\s+(\d{2}/\d{2}/\d{4})")
+CITY_PAIR_RE  = re.compile(r"^(.*?,[A-Za-z]{2})\s+(.*?,[A-Za-z]{2})$")
+# dernier nombre du texte (= revenue), découpé comme le ferait re.finditer (nombres atomiques)
+LAST_NUM_RE   = re.compile(rf"^((?:\D*(?>{NUM_PAT}))*?\D*)(?>({NUM_PAT}))\D*$", re.S)
+DMY_RE        = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+# deux premiers nombres (= cost, margin)
+TWO_NUMS_RE   = re.compile(rf"({NUM_PAT})(?:.*?({NUM_PAT}))?", re.S)
+
+@functools.lru_cache(maxsize=65536)
+def _unidecode(s: str) -> str:
+    # les mêmes clients reviennent d'un fichier à l'autre ; dans un fichier on passe par unique()
+    return unidecode(s)
+
+def parse_dates_ddmmyyyy(s: pd.Series) -> pd.Series:
+    """'DD/MM/YYYY' -> 'YYYY-MM-DD' en une passe (cache=True: dates répétées parsées une fois)."""
+    d = pd.to_datetime(s, format="%d/%m/%Y", errors="coerce", cache=True)
+    out = d.dt.strftime("%Y-%m-%d").copy()
+    bad = out.isna()
+    if bad.any():
+        # dates impossibles (31/02/2023) ou entourées de texte : simple réordonnancement textuel
+        m = s[bad].astype(str).str.extract(DMY_RE)
+        out[bad] = m[2] + "-" + m[1] + "-" + m[0]
+    return out.fillna("")
+
+def split_origin_dest_revenue(text: pd.Series) -> pd.DataFrame:
     """
     Reçoit typiquement: 'BOUCHERVILLE,PQ MONTREAL-NORD,PQ 225.00 CA'
-    -> ('BOUCHERVILLE,PQ', 'MONTREAL-NORD,PQ', 225.00)
+    -> ('BOUCHERVILLE,PQ', 'MONTREAL-NORD,PQ', 225.00), pour toute la colonne.
     """
-    if not isinstance(text, str):
-        return "", "", math.nan
-    t = text.strip()
+    t = text.str.strip()
 
     # récupère le dernier nombre = revenue (s'il existe)
-    m_rev = list(re.finditer(r"(\d+(?:\.\d{1,2})?)", t))
-    revenue = math.nan
-    if m_rev:
-        revenue = to_float(m_rev[-1].group(1))
-        t = t[:m_rev[-1].start()].strip()
+    m_rev = t.str.extract(LAST_NUM_RE)
+    revenue = pd.to_numeric(m_rev[1], errors="coerce").astype("float64")  # "59.0" comme float()
+    t = m_rev[0].str.strip().fillna(t)
 
     # coupe en deux villes '...,XX ...,...,YY'
-    m = re.match(r"^(.*?,[A-Za-z]{2})\s+(.*?,[A-Za-z]{2})$", t)
-    if m:
-        return m.group(1).strip(), m.group(2).strip(), revenue
-    return "", "", revenue
+    m = t.str.extract(CITY_PAIR_RE)
+    return pd.DataFrame({
+        "origin": m[0].str.strip().fillna(""),
+        "destination": m[1].str.strip().fillna(""),
+        "revenue": revenue,
+    })
 
 def normalize_one_file(path: Path):
     # on ignore déjà les fichiers normalisés et enrichis
     if path.name.endswith("_norm.tsv") or path.name.endswith("_enriched.tsv"):
         return False
 
-    # on s'attend à 4 colonnes Tabula (A,B,C,D), en-têtes variables
     df = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
     cols = list(df.columns)
 
-    # cas “brut” classique: 4 colonnes type ['Unnamed: 0', 'Unnamed: 1', '(By Requested Pickup date)', 'Unnamed: 4']
-    if len(cols) == 4:
+    # cas normal : sortie pdfplumber (pdf_to_tsv.py) déjà au bon schéma, on l'uniformise seulement
+    if all(c in df.columns for c in OUT_COLS):
+        out = df[OUT_COLS].copy()
+
+    # ancien cas “brut” Tabula, 4 colonnes (A,B,C,D) aux en-têtes variables, type ['Unnamed: 0', 'Unnamed: 1', '(By Requested Pickup date)', 'Unnamed: 4']
+    elif len(cols) == 4:
         colA, colB, colC, colD = cols
         a = df[colA].fillna("")
         b = df[colB].fillna("")      # customer
         c = df[colC].fillna("")      # origin dest revenue
         d = df[colD].fillna("")      # cost margin
 
-        rows = []
-        for a_val, cust, c_val, d_val in zip(a, b, c, d):
-            a_txt = str(a_val)
-
-            # Cherche "OrderNo  DD/MM/YYYY"
-            m = re.search(r"(\d+)\s+(\d{2}/\d{2}/\d{4})", a_txt)
-            if not m:
-                # saute les lignes d’entête ("Report Period", etc.)
-                continue
-
-            order_no = m.group(1)
-            req_date = parse_date_ddmmyyyy(m.group(2))
-            customer = unidecode(str(cust)).strip()
-
-            origin, destination, revenue = split_origin_dest_revenue(str(c_val))
-
-            # “130.00 95.00” -> cost, margin
-            nums = re.findall(r"(\d+(?:\.\d{1,2})?)", str(d_val))
-            cost   = to_float(nums[0]) if len(nums) >= 1 else math.nan
-            margin = to_float(nums[1]) if len(nums) >= 2 else math.nan
-
-            rows.append({
-                "order_no": order_no,
-                "req_pu_date": req_date,
-                "customer": customer,
-                "origin": origin,
-                "destination": destination,
-                "revenue": revenue,
-                "cost": cost,
-                "margin": margin,
-            })
-
-        if not rows:
+        # Cherche "OrderNo  DD/MM/YYYY" ; les lignes d’entête ("Report Period", etc.) sont écartées
+        m = a.str.extract(ORDER_DATE_RE)
+        ok = m[0].notna()
+        if not ok.any():
             print(f"⚠️  {path.name}: aucun enregistrement valide détecté (en-têtes ?)")
             return False
 
-        out = pd.DataFrame(rows, columns=OUT_COLS)
+        ode = split_origin_dest_revenue(c[ok])
+        # “130.00 95.00” -> cost, margin
+        cm = d[ok].str.extract(TWO_NUMS_RE)
+
+        out = pd.DataFrame({
+            "order_no": m.loc[ok, 0],
+            "req_pu_date": parse_dates_ddmmyyyy(m.loc[ok, 1]),
+            "customer": b[ok].map({u: _unidecode(u).strip() for u in b[ok].unique()}),
+            "origin": ode["origin"],
+            "destination": ode["destination"],
+            "revenue": ode["revenue"],
+            "cost": pd.to_numeric(cm[0], errors="coerce").astype("float64"),
+            "margin": pd.to_numeric(cm[1], errors="coerce").astype("float64"),
+        }, columns=OUT_COLS)
 
     else:
-        # Si le fichier a déjà le bon schéma, on l'uniformise seulement
-        if all(c in df.columns for c in OUT_COLS):
-            out = df[OUT_COLS].copy()
-        else:
-            print(f"⚠️  {path.name}: format inattendu (colonnes = {cols})")
-            return False
+        print(f"⚠️  {path.name}: format inattendu (colonnes = {cols})")
+        return False
 
     out_name = path.with_name(path.stem + "_norm.tsv")
     out.to_csv(out_name, sep="\t", index=False)
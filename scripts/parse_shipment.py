@@ -1,7 +1,9 @@
 # scripts/parse_shipment.py
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
-import csv, re, io
+import codecs, csv, re
 
 # --- chemins de travail ---
 RAW = Path("data/raw/SHIPMENT.TXT")   # ajuste si nom différent
@@ -14,53 +16,139 @@ OUT_SPLIT = OUTDIR / "by_year"
 OUT_SPLIT.mkdir(parents=True, exist_ok=True)
 
 ENCODINGS = ["utf-8", "cp1252", "latin-1"]
+SAMPLE_BYTES = 64 * 1024     # échantillon pour deviner l'encodage et lire la 1re ligne
+CHUNK_ROWS = 200_000         # lecture du TXT par blocs de lignes
+WRITE_WORKERS = 8            # écritures disque des fichiers annuels en parallèle
 
 # ---------------- utilitaires ----------------
-def read_text_any(path: Path) -> str:
-    """Lit le TXT en essayant plusieurs encodages courants (Windows/UTF-8)."""
+def sniff(path: Path) -> tuple[str, str]:
+    """Devine l'encodage (Windows/UTF-8) et la 1re ligne sur les 64 premiers Ko seulement."""
+    with open(path, "rb") as fh:
+        head = fh.read(SAMPLE_BYTES)
     for enc in ENCODINGS:
         try:
-            return path.read_text(encoding=enc, errors="strict")
-        except Exception:
+            # décodeur incrémental : un caractère multi-octets coupé en fin d'échantillon n'est pas une erreur
+            txt = codecs.getincrementaldecoder(enc)().decode(head, final=False)
+        except UnicodeDecodeError:
+            continue
+        lines = txt.splitlines()
+        return enc, lines[0] if lines else ""
+    return "latin-1", ""
+
+def read_any(read, enc: str) -> pd.DataFrame:
+    """read(encoding) avec l'encodage deviné, puis les suivants si un octet invalide apparaît plus loin."""
+    for e in ENCODINGS[ENCODINGS.index(enc):]:
+        try:
+            return read(e)
+        except UnicodeDecodeError:
             pass
-    return path.read_text(encoding="latin-1", errors="ignore")
+    return read("latin-1")
 
 NUM_RE = re.compile(r"^\s*-?\d+(?:\.\d+)?\s*$")
 DATEF_RE = re.compile(r"^\s*\d{8}(?:\.\d+)?\s*$")  # ex: 19981103.000000
 
-def is_num(tok: str) -> bool:
-    return bool(NUM_RE.match((tok or "").strip()))
-
-def is_date_float(tok: str) -> bool:
-    t = (tok or "").strip()
-    if not t or t == "0" or t.startswith("0."):
-        return False
-    return bool(DATEF_RE.match(t))
-
-def take(tokens, i):
-    if i < len(tokens):
-        return tokens[i].strip(), i + 1
-    return "", i + 1
-
-def parse_yyyymmdd_float(s):
-    s = (s or "").strip()
-    if not s or s == "0" or s.startswith("0."):
-        return pd.NaT
-    if "." in s:
-        s = s.split(".", 1)[0]
-    return pd.to_datetime(s, format="%Y%m%d", errors="coerce")
-
-def to_float(x):
-    x = (x or "").strip()
-    if x == "":
-        return None
-    try:
-        return float(x)
-    except Exception:
-        return None
+def _is_num(t: str) -> bool:
+    # rejet immédiat des jetons texte (1er caractère) avant la regex
+    c = t[:1]
+    return (c == "-" or c.isdigit()) and NUM_RE.match(t) is not None
+
+def _is_date_float(t: str) -> bool:
+    return len(t) >= 8 and t[0].isdigit() and DATEF_RE.match(t) is not None
+
+_num_match = np.frompyfunc(_is_num, 1, 1)
+_datef_match = np.frompyfunc(_is_date_float, 1, 1)
+
+def num_mask(tokens: np.ndarray) -> np.ndarray:
+    """Jetons numériques (ex: 1009.000000), sur un tableau de jetons nettoyés."""
+    return _num_match(tokens).astype(bool)
+
+def date_float_mask(tokens: np.ndarray) -> np.ndarray:
+    """Jetons "date float" AAAAMMJJ (ex: 19981103.000000), sur un tableau de jetons nettoyés."""
+    return _datef_match(tokens).astype(bool)
+
+def parse_yyyymmdd_float(s: pd.Series) -> pd.Series:
+    """Colonne de dates float AAAAMMJJ(.xxxxxx) -> datetime64 ; vide / 0 / 0.xxx -> NaT."""
+    s = s.str.strip().str.split(".", n=1).str[0]
+    s = s.mask((s == "") | (s == "0"))
+    return pd.to_datetime(s, format="%Y%m%d", errors="coerce", cache=True)
+
+def to_float(s: pd.Series) -> pd.Series:
+    """Colonne texte -> float64 ; vide / non numérique -> NaN."""
+    return pd.to_numeric(s.str.strip(), errors="coerce").astype("float64")
 
 # ------------- parseur COMMA non-quoté (structure confirmée) -------------
-def parse_line_comma(line: str) -> dict:
+AMOUNT_COLS = ["price", "cost1", "cost2", "cost3", "cost4"]
+# codes / noms de sites / drapeaux : peu de valeurs distinctes -> category (codes entiers + dictionnaire)
+CATEGORY_COLS = ["bill_to_code", "from_site_code", "from_site_name", "to_site_code", "to_site_name",
+                 "delivered_flag", "service_flag"]
+COMMA_FIELDS = [
+    "pickup_date_raw", "delivery_due_date_raw", "price", "delivered_flag",
+    "cost1", "cost2", "cost3", "cost4", None, "service_flag",   # None = marge place-holder (souvent vide/0)
+]
+
+_strip = np.frompyfunc(str.strip, 1, 1)
+
+def comma_tokens(path: Path, enc: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Découpe tout le fichier (parseur C de pandas par blocs, sans guillemets) :
+    -> matrice de jetons nettoyés (lignes x colonnes, "" au-delà de la fin de ligne)
+       et nombre de jetons réel de chaque ligne.
+    Le nombre de colonnes vient d'un comptage numpy des virgules par ligne,
+    directement sur les octets (virgule et saut de ligne sont ASCII dans les trois encodages).
+    """
+    buf = np.fromfile(path, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord("\n"))
+    if len(buf) and buf[-1] != ord("\n"):
+        ends = np.append(ends, len(buf))          # dernière ligne sans saut final
+    commas = np.flatnonzero(buf == ord(","))
+    n_tok = np.diff(np.searchsorted(commas, ends), prepend=0) + 1
+    del buf, commas
+
+    def read(e):
+        chunks = pd.read_csv(
+            path, encoding=e, sep=",", header=None, names=range(int(n_tok.max())),
+            dtype=str, quoting=csv.QUOTE_NONE, keep_default_na=False,
+            skip_blank_lines=False, lineterminator="\n", engine="c", chunksize=CHUNK_ROWS,
+        )
+        return pd.concat(chunks, ignore_index=True)
+
+    tok = read_any(read, enc)
+    tok = _strip(tok.to_numpy(dtype=object))   # une ligne lue = une ligne physique
+
+    # lignes vides / blanches ignorées
+    keep = (n_tok > 1) | (tok[:, 0] != "")
+    # marge de colonnes vides : les champs fixes lus après la fin de ligne valent ""
+    mat = np.full((int(keep.sum()), tok.shape[1] + len(COMMA_FIELDS) + 2), "", dtype=object)
+    mat[:, :tok.shape[1]] = tok[keep]
+    return mat, n_tok[keep]
+
+def join_cols(mat: np.ndarray, rows: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """",".join(mat[r, start:stop]) pour toutes les lignes rows (bornes communes)."""
+    if stop <= start:
+        return np.full(len(rows), "", dtype=object)
+    out = mat[rows, start].copy()
+    for c in range(start + 1, stop):
+        out = out + "," + mat[rows, c]
+    return out
+
+def first_match(mat: np.ndarray, n_tok: np.ndarray, start: np.ndarray, mask_fn) -> np.ndarray:
+    """
+    Par ligne : 1re colonne >= start (avant la fin de ligne) dont le jeton vérifie mask_fn,
+    sinon max(start, n_tok). Colonne par colonne, on ne teste que les lignes non résolues
+    (la plupart le sont dès la 1re ou 2e colonne).
+    """
+    k = np.maximum(start, n_tok)
+    pos = start.copy()
+    todo = np.flatnonzero(pos < n_tok)
+    while len(todo):
+        hit = mask_fn(mat[todo, pos[todo]])
+        k[todo[hit]] = pos[todo[hit]]
+        todo = todo[~hit]
+        pos[todo] += 1
+        todo = todo[pos[todo] < n_tok[todo]]
+    return k
+
+def parse_comma(path: Path, enc: str) -> pd.DataFrame:
     """
     Recompose correctement les champs texte qui contiennent des virgules.
     Structure (confirmée par tes exemples) :
@@ -68,100 +156,83 @@ def parse_line_comma(line: str) -> dict:
       from_site_name..., to_site_code, to_site_name..., pickup_date,
       delivery_due_date, price, delivered_flag, cost1, cost2, cost3, cost4,
       (champ vide/marge place-holder), service_flag, [éventuel champ vide final]
+
+    Vectorisé : les bornes des noms de sites (to_site_code = 1er jeton numérique
+    après from_site_code, pickup = 1re date float ensuite) sont trouvées par colonne,
+    puis les lignes partageant les mêmes bornes sont assemblées ensemble.
     """
-    tks = line.rstrip("\n").split(",")
-    i = 0
-
-    shipment_no, i     = take(tks, i)
-    order_date_raw, i  = take(tks, i)
-    bill_to_code, i    = take(tks, i)
-    from_site_code, i  = take(tks, i)
-
-    # from_site_name : concatène jusqu'au prochain "numérique" (to_site_code)
-    parts = []
-    while i < len(tks) and not is_num(tks[i]):
-        parts.append(tks[i]); i += 1
-    from_site_name = ",".join(p.strip() for p in parts)
-
-    to_site_code, i = take(tks, i)  # numérique attendu
-
-    # to_site_name : concatène jusqu'à rencontrer une "date float" (pickup)
-    parts = []
-    while i < len(tks) and not is_date_float(tks[i]):
-        parts.append(tks[i]); i += 1
-    to_site_name = ",".join(p.strip() for p in parts)
-
-    pickup_date_raw, i       = take(tks, i)
-    delivery_due_date_raw, i = take(tks, i)
-    price_raw, i             = take(tks, i)
-    delivered_flag, i        = take(tks, i)
-    cost1_raw, i             = take(tks, i)
-    cost2_raw, i             = take(tks, i)
-    cost3_raw, i             = take(tks, i)
-    cost4_raw, i             = take(tks, i)
-    _margin_placeholder, i   = take(tks, i)   # souvent vide/0
-    service_flag, i          = take(tks, i)
-
-    # s'il reste un dernier token vide dû à une virgule finale, on l'ignore
-
-    return {
-        "shipment_number": shipment_no,
-        "order_date_raw": order_date_raw,
-        "bill_to_code": bill_to_code,
-        "from_site_code": from_site_code,
-        "from_site_name": from_site_name,
-        "to_site_code": to_site_code,
-        "to_site_name": to_site_name,
-        "pickup_date_raw": pickup_date_raw,
-        "delivery_due_date_raw": delivery_due_date_raw,
-        "price": price_raw,
-        "delivered_flag": delivered_flag,
-        "cost1": cost1_raw,
-        "cost2": cost2_raw,
-        "cost3": cost3_raw,
-        "cost4": cost4_raw,
-        "service_flag": service_flag,
+    mat, n_tok = comma_tokens(path, enc)
+    n = len(mat)
+    rows = np.arange(n)
+
+    # from_site_name : jetons jusqu'au prochain "numérique" (to_site_code)
+    k1 = first_match(mat, n_tok, np.full(n, 4), num_mask)
+    # to_site_name : jetons jusqu'à rencontrer une "date float" (pickup)
+    k2 = first_match(mat, n_tok, k1 + 1, date_float_mask)
+
+    # noms de sites : une concaténation vectorisée par couple de bornes (k1, k2)
+    from_name = np.empty(n, dtype=object)
+    to_name = np.empty(n, dtype=object)
+    for (a, b), idx in pd.DataFrame({"a": k1, "b": k2}).groupby(["a", "b"]).indices.items():
+        from_name[idx] = join_cols(mat, idx, 4, a)
+        to_name[idx] = join_cols(mat, idx, a + 1, b)
+
+    cols = {
+        "shipment_number": mat[:, 0],
+        "order_date_raw": mat[:, 1],
+        "bill_to_code": mat[:, 2],
+        "from_site_code": mat[:, 3],
+        "from_site_name": from_name,
+        "to_site_code": mat[rows, k1],
+        "to_site_name": to_name,
     }
+    for j, name in enumerate(COMMA_FIELDS):
+        if name:
+            cols[name] = mat[rows, k2 + j]
+    # s'il reste un dernier jeton vide dû à une virgule finale, il est ignoré
+    return pd.DataFrame(cols)
 
 # -------------------------- pipeline principal --------------------------
 def main():
     if not RAW.exists():
         raise FileNotFoundError(f"Introuvable: {RAW}. Vérifie le chemin exact.")
 
-    txt = read_text_any(RAW)
-    first = txt.splitlines()[0] if txt else ""
+    enc, first = sniff(RAW)
 
     # 1) Cas idéal : export TAB -> lecture directe
     if "\t" in first:
-        df = pd.read_csv(
-            io.StringIO(txt),
+        df = read_any(lambda e: pd.read_csv(
+            RAW,
+            encoding=e,
             sep="\t",
             dtype=str,
-            engine="python",
+            quoting=csv.QUOTE_NONE,     # export non-quoté : un '"' dans un nom ne doit pas avaler les lignes suivantes
+            engine="c",
             header=0 if any(ch.isalpha() for ch in first) else None,
             on_bad_lines="skip",
-        )
+        ), enc)
         # si pas de header réel
         if not any(str(c).strip() for c in df.columns):
-            df = pd.read_csv(io.StringIO(txt), sep="\t", dtype=str, header=None, engine="python")
+            df = read_any(lambda e: pd.read_csv(RAW, encoding=e, sep="\t", dtype=str, header=None,
+                                                  quoting=csv.QUOTE_NONE, engine="c"), enc)
             df.columns = [f"col_{i+1}" for i in range(df.shape[1])]
     else:
         # 2) Ancien export COMMA non-quoté -> reconstruction
-        lines = [ln for ln in txt.splitlines() if ln.strip()]
-        rows = [parse_line_comma(ln) for ln in lines]
-        df = pd.DataFrame(rows)
+        df = parse_comma(RAW, enc)
 
         # conversions typées utiles
         for dcol in ["order_date_raw","pickup_date_raw","delivery_due_date_raw"]:
-            df[dcol.replace("_raw","")] = df[dcol].apply(parse_yyyymmdd_float)
-        for c in ["price","cost1","cost2","cost3","cost4"]:
-            df[c] = df[c].apply(to_float)
+            df[dcol.replace("_raw","")] = parse_yyyymmdd_float(df[dcol])
+        df[AMOUNT_COLS] = df[AMOUNT_COLS].apply(to_float)
+        df[CATEGORY_COLS] = df[CATEGORY_COLS].astype("category")
         # coût par défaut (ajuste si besoin)
         df["cost"] = df["cost1"]
         df["margin"] = (df["price"] - df["cost"]).where(df["price"].notna() & df["cost"].notna())
 
-    # nettoyage
-    df = df.dropna(axis=1, how="all").dropna(axis=0, how="all")
+    # nettoyage (colonnes / lignes entièrement vides) + ordre conseillé, en une seule sélection
+    notna = df.notna().to_numpy()
+    col_ok = dict(zip(df.columns, notna.any(axis=0)))
+    row_ok = notna.any(axis=1)
 
     # ordre conseillé des colonnes si elles existent
     preferred = [
@@ -174,40 +245,57 @@ def main():
         "delivered_flag","service_flag",
         "margin",
     ]
-    cols = [c for c in preferred if c in df.columns] + [c for c in df.columns if c not in preferred]
-    df = df[cols]
+    cols = [c for c in preferred if col_ok.get(c)] + [c for c in df.columns if c not in preferred and col_ok[c]]
+    df = df.loc[row_ok, cols]
 
     # ------------- sorties principales -------------
     df.to_csv(OUT_CSV, index=False, quoting=csv.QUOTE_MINIMAL)
     df.to_csv(OUT_TSV, index=False, sep="\t")
+    # jumeau Parquet (typé, colonnaire) : relecture sans re-parsing texte
+    df.to_parquet(OUT_CSV.with_suffix(".parquet"), compression="zstd", index=False)
 
     # master minimal pour analyse / GPT
+    site = df.get("from_site_name")   # customer et origin : une seule colonne lue, partagée
     master = pd.DataFrame({
         "date": df.get("order_date"),
         "order_no": df.get("shipment_number"),
-        "customer": df.get("from_site_name"),
-        "origin": df.get("from_site_name"),
+        "customer": site,
+        "origin": site,
         "destination": df.get("to_site_name"),
         "revenue": pd.to_numeric(df.get("price"), errors="coerce"),
         "cost": pd.to_numeric(df.get("cost"), errors="coerce"),
-    })
-    master["margin"] = master["revenue"] - master["cost"]
+    }, index=df.index)   # index explicite : export TAB sans ces colonnes -> colonnes vides plutôt qu'une erreur
+    master["margin"] = master["revenue"].sub(master["cost"])
     master.to_csv(OUT_MIN, index=False)
+    master.to_parquet(OUT_MIN.with_suffix(".parquet"), compression="zstd", index=False)
 
     # ------------- split annuel -------------
     if "order_date" in df.columns:
-        dty = pd.to_datetime(df["order_date"], errors="coerce")
-        df_year = df.assign(year=dty.dt.year)
-        for year, sub in df_year.groupby("year"):
-            if pd.isna(year):
-                continue
-            out_path = OUT_SPLIT / f"master2_{int(year)}.csv"
-            sub.drop(columns=["year"]).to_csv(out_path, index=False)
-            print(f"  → {out_path} ({sub.shape[0]} lignes)")
+        dty = df["order_date"]
+        if not pd.api.types.is_datetime64_any_dtype(dty):   # export TAB : colonne encore texte
+            dty = pd.to_datetime(dty, errors="coerce")
+        # un tri stable par année puis des tranches contiguës (searchsorted) au lieu d'un groupby
+        years = dty.dt.year.to_numpy(dtype=float)
+        order = np.argsort(years, kind="stable")      # NaN (dates illisibles) en fin, ignorés
+        ys = years[order]
+        uniq = np.unique(ys[~np.isnan(ys)])
+        starts = np.searchsorted(ys, uniq)
+        ends = np.searchsorted(ys, uniq, side="right")
+        out_df = df.drop(columns=["year"], errors="ignore")
+        # CSV formatés en mémoire, puis écrits ensemble (les appels système se chevauchent)
+        pieces = [
+            (OUT_SPLIT / f"master2_{int(y)}.csv", out_df.iloc[order[a:b]].to_csv(None, index=False), b - a)
+            for y, a, b in zip(uniq, starts, ends)
+        ]
+        with ThreadPoolExecutor(max_workers=min(WRITE_WORKERS, len(pieces) or 1)) as pool:
+            list(pool.map(lambda piece: piece[0].write_text(piece[1], encoding="utf-8"), pieces))
+        for out_path, _, n in pieces:
+            print(f"  → {out_path} ({n} lignes)")
 
     print(f"✅ Export OK : {OUT_CSV}  ({df.shape[0]} lignes, {df.shape[1]} colonnes)")
     print(f"✅ TSV OK    : {OUT_TSV}")
     print(f"✅ Minimal   : {OUT_MIN}")
+    print(f"✅ Parquet   : {OUT_CSV.with_suffix('.parquet')}, {OUT_MIN.with_suffix('.parquet')}")
     print(f"✅ Split     : {OUT_SPLIT}")
 
 if __name__ == "__main__":
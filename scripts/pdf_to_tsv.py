@@ -3,25 +3,30 @@
 
 """
 Extraction Orders PDF -> TSV (sans Java)
-- Tente tables pdfplumber
-- Fallback parsing texte (regex) si besoin
+- Parsing texte (regex) sur le texte pypdfium2
+- Fallback tables pdfplumber si une page ne donne rien
 Sorties : data/processed/pdf_csv/ordersYYYY.tsv
 
 Colonnes: order_no, req_pu_date, customer, origin, destination, revenue, cost, margin
 """
 
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import os
 import re
 import sys
 import csv
 import pandas as pd
 import pdfplumber
+import pypdfium2 as pdfium
 
 RAW_DIR = Path("data/raw")
 OUT_DIR = Path("data/processed/pdf_csv")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+PAGES_PER_JOB = 4  # pages par tâche du pool de processus
+
 # Réglages d'extraction de tables pdfplumber (sans keep_blank_chars)
 TABLE_SETTINGS = dict(
     vertical_strategy="lines",
@@ -36,9 +41,28 @@ TABLE_SETTINGS = dict(
 
 MONEY_RE = re.compile(r"^\$?\s*([0-9]{1,3}(?:,[0-9]{3})*|[0-9]+)(?:\.[0-9]{2})?$")
 CLEAN_MONEY_RE = re.compile(r"[^\d\.]")
+# "$", espaces et virgules supprimés, "O" -> "0" (sécurité OCR) : une seule passe par valeur
+MONEY_TRANS = str.maketrans({"$": None, "O": "0", " ": None, ",": None})
 
 HDR_RE = re.compile(r"\bOrder\s+No\b", re.I)
 
+# Regex des helpers appelés par cellule / par ligne, compilées une fois
+SPACES_RE   = re.compile(r"\s+")
+DMY_RE      = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+ORDER_NO_RE = re.compile(r"\b(\d{5})\b")
+ORDER5_RE   = re.compile(r"\d{5}")
+DATE_RE     = re.compile(r"\b(\d{2}/\d{2}/\d{4})\b")
+CITY_END_RE = re.compile(r",[A-Z]{2}$")
+AMOUNT_RE   = re.compile(r"\d{1,3}(?:,\d{3})*\.\d{2}")
+# cas usuel : "revenue cost margin" en fin de ligne (CA/$ optionnels) ; ancré, sans liste intermédiaire
+TAIL3_RE    = re.compile(
+    rf"(?<![\d,.])({AMOUNT_RE.pattern})\s*(?:CA|\$)?\s+({AMOUNT_RE.pattern})\s*(?:CA|\$)?\s+({AMOUNT_RE.pattern})\s*$"
+)
+YEAR_RE     = re.compile(r"(\d{4})")
+
+# Ordre des champs des tuples produits par map_row_from_table / parse_lines_to_rows
+OUT_COLS = ["order_no", "req_pu_date", "customer", "origin", "destination", "revenue", "cost", "margin"]
+
 LINE_RE = re.compile(
     r"""
     (?P<order>\d{5})\s+
@@ -53,27 +77,15 @@ LINE_RE = re.compile(
     re.X,
 )
 
-def clean_money(x: str | float | int) -> float:
-    if x is None:
-        return 0.0
-    if isinstance(x, (int, float)):
-        return float(x)
-    s = str(x).strip()
-    if not s:
-        return 0.0
-    s = s.replace("CA", "").replace("$", "")
-    s = s.replace("O", "0")  # sécurité OCR
-    s = s.replace(" ", "")
-    s = s.replace(",", "")
-    try:
-        return float(s)
-    except Exception:
-        return 0.0
+def clean_money(s: pd.Series) -> pd.Series:
+    """Montants texte -> float, vectorisé sur toute la colonne (0.0 si illisible)."""
+    s = s.astype("string").str.strip().str.replace("CA", "", regex=False).str.translate(MONEY_TRANS)
+    return pd.to_numeric(s, errors="coerce").astype("float64").fillna(0.0)
 
 def normalize_date(d: str) -> str:
     d = (d or "").strip()
     # dd/mm/yyyy -> yyyy-mm-dd
-    m = re.match(r"(\d{2})/(\d{2})/(\d{4})", d)
+    m = DMY_RE.match(d)
     if m:
         dd, mm, yyyy = m.groups()
         return f"{yyyy}-{mm}-{dd}"
@@ -83,12 +95,16 @@ def is_header_line(text: str) -> bool:
     return bool(HDR_RE.search(text))
 
 def collapse_spaces(s: str) -> str:
-    return re.sub(r"\s+", " ", s).strip()
+    return SPACES_RE.sub(" ", s).strip()
 
 # ---- Extraction par tables ----
 
 def tables_to_rows(page: pdfplumber.page.Page) -> list[list[str]]:
     rows: list[list[str]] = []
+    # stratégie "lines" : sans aucun trait/rectangle sur la page, aucune table possible ;
+    # on évite alors la détection (intersections + regroupement des caractères)
+    if not page.edges:
+        return rows
     try:
         tables = page.extract_tables(TABLE_SETTINGS) or []
     except Exception:
@@ -106,7 +122,7 @@ def tables_to_rows(page: pdfplumber.page.Page) -> list[list[str]]:
             rows.append(row)
     return rows
 
-def map_row_from_table(row: list[str]) -> dict | None:
+def map_row_from_table(row: list[str]) -> tuple | None:
     """
     On tente de reconnaître l’ordre des colonnes dans une ligne extraite en table.
     Plusieurs PDF collent "revenue cost margin" dans une seule cellule; on gère ce cas.
@@ -115,8 +131,8 @@ def map_row_from_table(row: list[str]) -> dict | None:
         return None
     # prio: trouver le numéro d’ordre & date
     joined = " ".join(row)
-    m_order = re.search(r"\b(\d{5})\b", joined)
-    m_date = re.search(r"\b(\d{2}/\d{2}/\d{4})\b", joined)
+    m_order = ORDER_NO_RE.search(joined)
+    m_date = DATE_RE.search(joined)
     order = m_order.group(1) if m_order else None
     date = normalize_date(m_date.group(1)) if m_date else ""
 
@@ -128,7 +144,7 @@ def map_row_from_table(row: list[str]) -> dict | None:
         # tente de localiser origin / dest: pattern "...,XX"
         def first_city_idx(start=0):
             for i in range(start, len(cells)):
-                if re.search(r",[A-Z]{2}$", cells[i]):
+                if CITY_END_RE.search(cells[i]):
                     return i
             return -1
 
@@ -154,49 +170,29 @@ def map_row_from_table(row: list[str]) -> dict | None:
             if c == origin:
                 break
             # saute order/date si identiques
-            if c == order or c == re.sub("-", "/", date):
+            if c == order or c == date.replace("-", "/"):
                 continue
             # ignore rubriques genre "CA"
             customer_parts.append(c)
         customer = collapse_spaces(" ".join(customer_parts))
 
-        # Récup valeurs financières : on regarde les dernières valeurs numériques
-        tail = cells[-3:]
-        nums = []
-        for c in tail:
-            # si c est "rev cost margin" collés : découpe
-            found = re.findall(r"\d{1,3}(?:,\d{3})*\.\d{2}", c)
-            if found:
-                nums.extend(found)
-        if len(nums) < 3:
-            # essaie en scannant toutes les cells de droite à gauche
-            for c in reversed(cells):
-                found = re.findall(r"\d{1,3}(?:,\d{3})*\.\d{2}", c)
-                for f in reversed(found):
-                    nums.append(f)
-                if len(nums) >= 3:
-                    break
-        nums = nums[-3:] if nums else ["0.00", "0.00", "0.00"]
-        rev, cost, margin = (clean_money(n) for n in nums)
+        # Récup valeurs financières : les 3 derniers montants de la ligne, en une passe
+        # (gère aussi "revenue cost margin" collés dans une seule cellule)
+        m_tail = TAIL3_RE.search(joined)
+        if m_tail:
+            nums = m_tail.groups()
+        else:
+            nums = [m.group() for m in AMOUNT_RE.finditer(joined)][-3:] or ["0.00", "0.00", "0.00"]
+        rev, cost, margin = nums  # converties en bloc dans process_pdf
 
         # sanity minimal
         if order and customer and (origin or dest):
-            return dict(
-                order_no=order,
-                req_pu_date=date,
-                customer=customer,
-                origin=origin,
-                destination=dest,
-                revenue=rev,
-                cost=cost,
-                margin=margin,
-            )
+            return (order, date, customer, origin, dest, rev, cost, margin)  # ordre OUT_COLS
     return None
 
-# ---- Extraction en mode texte (fallback) ----
+# ---- Extraction en mode texte ----
 
-def text_blocks_after_header(page: pdfplumber.page.Page) -> list[str]:
-    txt = page.extract_text() or ""
+def text_blocks_after_header(txt: str) -> list[str]:
     if not txt.strip():
         return []
     lines = [collapse_spaces(x) for x in txt.splitlines()]
@@ -209,26 +205,30 @@ def text_blocks_after_header(page: pdfplumber.page.Page) -> list[str]:
     return lines[start:]
 
 
-def parse_lines_to_rows(lines: list[str]) -> list[dict]:
+def parse_lines_to_rows(lines: list[str]) -> list[tuple]:
     """
     Assemble les lignes et applique la regex de détail.
     Certaines PDF coupent les colonnes en plusieurs lignes; on recolle 2-3 lignes.
     """
-    out: list[dict] = []
+    out: list[tuple] = []
     buf: list[str] = []
     def try_flush():
         joined = " ".join(buf)
+        # LINE_RE exige une date (/), des villes ",XX" et des montants (.) : filtre bon marché avant la regex
+        if "/" not in joined or "," not in joined or "." not in joined:
+            return False
         m = LINE_RE.search(joined)
         if m:
-            out.append(dict(
-                order_no=m.group("order"),
-                req_pu_date=normalize_date(m.group("date")),
-                customer=collapse_spaces(m.group("customer")),
-                origin=collapse_spaces(m.group("origin")),
-                destination=collapse_spaces(m.group("dest")),
-                revenue=clean_money(m.group("rev")),
-                cost=clean_money(m.group("cost")),
-                margin=clean_money(m.group("margin")),
+            d = m.group("date")  # déjà validée dd/mm/yyyy par LINE_RE : simple découpage
+            out.append((  # ordre OUT_COLS
+                m.group("order"),
+                f"{d[6:10]}-{d[3:5]}-{d[0:2]}",
+                collapse_spaces(m.group("customer")),
+                collapse_spaces(m.group("origin")),
+                collapse_spaces(m.group("dest")),
+                m.group("rev"),
+                m.group("cost"),
+                m.group("margin"),
             ))
             return True
         return False
@@ -250,50 +250,79 @@ def parse_lines_to_rows(lines: list[str]) -> list[dict]:
 
 # ---- Pipeline par page ----
 
-def extract_page_records(page: pdfplumber.page.Page) -> list[dict]:
-    # 1) tente via tables
-    table_rows = tables_to_rows(page)
-    mapped: list[dict] = []
-    for r in table_rows:
+def pdfium_page_text(doc: pdfium.PdfDocument, index: int) -> str:
+    # couche texte brute via PDFium (C) : bien plus rapide que page.extract_text() de pdfplumber
+    textpage = doc[index].get_textpage()
+    try:
+        return textpage.get_text_bounded() or ""
+    finally:
+        textpage.close()
+
+def table_records(page: pdfplumber.page.Page) -> list[tuple]:
+    """Lignes reconnues dans les tables pdfplumber d'une page."""
+    mapped: list[tuple] = []
+    for r in tables_to_rows(page):
         m = map_row_from_table(r)
         if m:
             mapped.append(m)
-    if mapped:
-        return mapped
-
-    # 2) fallback : texte
-    lines = text_blocks_after_header(page)
-    if not lines:
-        return []
-    return parse_lines_to_rows(lines)
+    return mapped
 
 # ---- Fichier entier ----
 
-def process_pdf(pdf_path: Path) -> pd.DataFrame:
-    all_rows: list[dict] = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for pi, page in enumerate(pdf.pages, start=1):
-            recs = extract_page_records(page)
+def extract_pages(pdf_path: Path, first: int = 0, last: int | None = None) -> list[tuple]:
+    """
+    Lignes des pages [first, last) d'un PDF, dans l'ordre des pages.
+    Texte PDFium d'abord (les rapports sont des lignes de texte alignées) ; pdfplumber
+    n'est ouvert que si une page ne donne rien, pour tenter ses tables.
+    """
+    all_rows: list[tuple] = []
+    doc = pdfium.PdfDocument(str(pdf_path))
+    pdf = None
+    try:
+        for i in range(first, len(doc) if last is None else last):
+            recs = parse_lines_to_rows(text_blocks_after_header(pdfium_page_text(doc, i)))
+            if not recs:
+                if pdf is None:
+                    pdf = pdfplumber.open(pdf_path)
+                page = pdf.pages[i]
+                recs = table_records(page)
+                page.close()  # libère les objets de mise en page mis en cache pour cette page
             all_rows.extend(recs)
+    finally:
+        doc.close()
+        if pdf is not None:
+            pdf.close()
+    return all_rows
 
-    df = pd.DataFrame(all_rows, columns=[
-        "order_no", "req_pu_date", "customer", "origin",
-        "destination", "revenue", "cost", "margin"
-    ])
+def rows_to_frame(all_rows: list[tuple]) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(all_rows, columns=OUT_COLS)
 
     # Nettoyage final
     df = df.dropna(how="all")
     # filtre évidences fausses : order_no doit être 5 chiffres
-    df = df[df["order_no"].astype(str).str.fullmatch(r"\d{5}", na=False)]
+    df = df[df["order_no"].astype(str).str.fullmatch(ORDER5_RE, na=False)]
     # dates normalisées
     df["req_pu_date"] = df["req_pu_date"].astype(str)
 
-    # types numériques
+    # types numériques (montants restés en texte jusqu'ici)
     for c in ["revenue", "cost", "margin"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
+        df[c] = clean_money(df[c])
 
     return df.reset_index(drop=True)
 
+def process_pdf(pdf_path: Path) -> pd.DataFrame:
+    return rows_to_frame(extract_pages(pdf_path))
+
+def submit_pdf(ex: ProcessPoolExecutor, pdf_path: Path) -> list:
+    """Soumet le PDF au pool par tranches de PAGES_PER_JOB pages."""
+    doc = pdfium.PdfDocument(str(pdf_path))
+    try:
+        n_pages = len(doc)
+    finally:
+        doc.close()
+    return [ex.submit(extract_pages, pdf_path, a, min(a + PAGES_PER_JOB, n_pages))
+            for a in range(0, n_pages, PAGES_PER_JOB)]
+
 # ---- Main ----
 
 def main():
@@ -302,12 +331,24 @@ def main():
         print("⚠️  Aucun PDF trouvé dans data/raw (pattern orders*.pdf)")
         sys.exit(0)
 
-    for pdf_path in pdfs:
-        year = re.search(r"(\d{4})", pdf_path.stem)
+    # tranches de pages réparties sur tous les cœurs (PDFium n'est pas thread-safe, le repli
+    # pdfplumber est du Python pur) ; les tranches sont recollées et écrites dans l'ordre
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as ex:
+        jobs = []
+        for pdf_path in pdfs:
+            print(f"📄 {pdf_path.name} → extraction…")
+            try:
+                jobs.append((pdf_path, submit_pdf(ex, pdf_path), None))
+            except Exception as e:
+                jobs.append((pdf_path, [], e))
+
+    for pdf_path, parts, err in jobs:
+        year = YEAR_RE.search(pdf_path.stem)
         y = year.group(1) if year else "unknown"
-        print(f"📄 {pdf_path.name} → extraction…")
         try:
-            df = process_pdf(pdf_path)
+            if err is not None:
+                raise err
+            df = rows_to_frame([r for part in parts for r in part.result()])
         except Exception as e:
             print(f"❌ Échec {pdf_path.name}: {e}")
             continue
@@ -1,7 +1,7 @@
 # scripts/split_csv.py
-import pandas as pd
 from pathlib import Path
 import math
+import numpy as np
 
 SRC = Path("data/processed/master2.csv")
 OUTDIR = Path("data/processed/chunks")
@@ -9,14 +9,19 @@ OUTDIR.mkdir(parents=True, exist_ok=True)
 
 ROWS_PER_CHUNK = 1500  # ajuste si besoin
 
-df = pd.read_csv(SRC, encoding="latin-1")
-n = len(df)
+# découpe par plages d'octets : pas de parsing ni de réécriture des champs, encodage conservé tel quel
+# (master2.csv est écrit par parse_shipment.py : aucun champ ne contient de saut de ligne)
+data = SRC.read_bytes()
+if data and not data.endswith(b"\n"):
+    data += b"\n"
+offs = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1   # débuts de ligne suivante
+header = data[:offs[0]]
+n = len(offs) - 1
 nchunks = math.ceil(n / ROWS_PER_CHUNK)
 
 for i in range(nchunks):
-    start = i * ROWS_PER_CHUNK
-    end = min((i + 1) * ROWS_PER_CHUNK, n)
-    part = df.iloc[start:end]
+    first = i * ROWS_PER_CHUNK
+    last = min(first + ROWS_PER_CHUNK, n)
     out = OUTDIR / f"master2_part_{i+1:03d}.csv"
-    part.to_csv(out, index=False)
-    print(f"Chunk {i+1}/{nchunks} -> {out} ({len(part)} lignes)")
+    out.write_bytes(header + data[offs[first]:offs[last]])
+    print(f"Chunk {i+1}/{nchunks} -> {out} ({last - first} lignes)")